@@ -20,6 +20,7 @@ import * as vscode from "vscode";
 // @ts-ignore - Raw string import
 import pyodideKernelCode from "../../../webview/services/pyodide/pyodide_kernel.py";
 import { getValidatedSettingsGroup } from "../../services/config/settingsValidator";
+import { fromPython } from "./pyodidePayload";
 
 /**
  * Pending execution context for routing Pyodide messages to correct cell.
@@ -137,7 +138,7 @@ from types import ModuleType
 pyodide_kernel = ModuleType('pyodide_kernel')
 
 # Execute the kernel code in the module's namespace
-exec('''${pyodideKernelCode.replace(/'/g, "\\'")}''', pyodide_kernel.__dict__)
+exec('''${pyodideKernelCode.replace(/\\/g, "\\\\").replace(/'/g, "\\'")}''', pyodide_kernel.__dict__)
 
 # Register in sys.modules so it can be imported
 sys.modules['pyodide_kernel'] = pyodide_kernel
@@ -205,16 +206,9 @@ sys.modules['pyodide_kernel'] = pyodide_kernel
       metadata: unknown,
       _transient: unknown,
     ): void => {
-      // Convert Python dicts to JavaScript objects
-      const dataObj =
-        data && typeof data === "object" && "toJs" in data
-          ? (data as { toJs: () => Record<string, unknown> }).toJs()
-          : (data as Record<string, unknown>);
-
-      const metadataObj =
-        metadata && typeof metadata === "object" && "toJs" in metadata
-          ? (metadata as { toJs: () => Record<string, unknown> }).toJs()
-          : (metadata as Record<string, unknown> | undefined);
+      // Parse the JSON payloads into JavaScript objects
+      const dataObj = fromPython(data) ?? {};
+      const metadataObj = fromPython(metadata);
 
       this._handleDisplayData(msgId, dataObj, metadataObj);
     };
@@ -225,16 +219,9 @@ sys.modules['pyodide_kernel'] = pyodide_kernel
       data: unknown,
       metadata: unknown,
     ): void => {
-      // Convert Python dicts to JavaScript objects
-      const dataObj =
-        data && typeof data === "object" && "toJs" in data
-          ? (data as { toJs: () => Record<string, unknown> }).toJs()
-          : (data as Record<string, unknown>);
-
-      const metadataObj =
-        metadata && typeof metadata === "object" && "toJs" in metadata
-          ? (metadata as { toJs: () => Record<string, unknown> }).toJs()
-          : (metadata as Record<string, unknown> | undefined);
+      // Parse the JSON payloads into JavaScript objects
+      const dataObj = fromPython(data) ?? {};
+      const metadataObj = fromPython(metadata);
 
       // Execution results are displayed the same way as display_data
       this._handleDisplayData(msgId, dataObj, metadataObj);
@@ -387,10 +374,10 @@ backend_inline.configure_inline_support(pyodide_kernel.ipython_shell, 'inline')
       this._currentMsgId = item.msgId;
 
       // Execute Python code using IPython shell for clean error tracebacks
-      // Set message ID in Python global scope for callback routing
+      // Set message ID in the kernel module for callback routing
       await this._pyodide!.runPythonAsync(`
-import builtins
-builtins._current_msg_id = ${item.msgId}
+import pyodide_kernel
+pyodide_kernel.set_current_msg_id(${item.msgId})
 `);
 
       // Execute code through IPython shell
@@ -0,0 +1,30 @@
+/*
+ * Copyright (c) 2021-2025 Datalayer, Inc.
+ *
+ * MIT License
+ */
+
+/**
+ * Decoding of display payloads sent by the Pyodide kernel.
+ *
+ * @module kernel/clients/pyodidePayload
+ */
+
+/**
+ * Converts a display payload received from Python into a plain object.
+ * The kernel sends data and metadata as JSON text; PyProxy dicts are still accepted.
+ * @param value - JSON string, PyProxy dict, or nullish value from Python.
+ *
+ * @returns Plain object, or undefined when there is no payload.
+ */
+export function fromPython(
+  value: unknown,
+): Record<string, unknown> | undefined {
+  if (typeof value === "string") {
+    return (JSON.parse(value) as Record<string, unknown> | null) ?? undefined;
+  }
+  if (value && typeof value === "object" && "toJs" in value) {
+    return (value as { toJs: () => Record<string, unknown> }).toJs();
+  }
+  return (value as Record<string, unknown> | null) ?? undefined;
+}
@@ -0,0 +1,48 @@
+/*
+ * Copyright (c) 2021-2025 Datalayer, Inc.
+ *
+ * MIT License
+ */
+
+/**
+ * Tests for decoding Pyodide kernel display payloads.
+ * The kernel sends display data and metadata as JSON text; these tests cover
+ * that contract plus the PyProxy and nullish inputs still accepted.
+ */
+
+import * as assert from "assert";
+
+import { fromPython } from "../../kernel/clients/pyodidePayload";
+
+suite("Pyodide Payload Tests", () => {
+  test("parses JSON text sent by the kernel", () => {
+    const payload = fromPython('{"text/plain":"x","image/png":"iVBORw=="}');
+    assert.deepStrictEqual(payload, {
+      "text/plain": "x",
+      "image/png": "iVBORw==",
+    });
+  });
+
+  test("maps JSON null to undefined", () => {
+    assert.strictEqual(fromPython("null"), undefined);
+  });
+
+  test("converts PyProxy-like objects with toJs", () => {
+    const proxy = { toJs: () => ({ width: 10 }) };
+    assert.deepStrictEqual(fromPython(proxy), { width: 10 });
+  });
+
+  test("returns plain objects unchanged", () => {
+    const data = { "text/plain": "x" };
+    assert.strictEqual(fromPython(data), data);
+  });
+
+  test("returns undefined for nullish values", () => {
+    assert.strictEqual(fromPython(null), undefined);
+    assert.strictEqual(fromPython(undefined), undefined);
+  });
+
+  test("throws on malformed JSON text", () => {
+    assert.throws(() => fromPython("{"), SyntaxError);
+  });
+});
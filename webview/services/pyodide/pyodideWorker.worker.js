@@ -101,6 +101,23 @@ async function initPyodide(
       return out;
     }
 
+    /**
+     * Converts a display payload received from Python into a plain object.
+     * The kernel sends data and metadata as JSON text; PyProxy dicts are still accepted.
+     * @param value - JSON string, PyProxy dict, or nullish value from Python.
+     *
+     * @returns Plain object, or an empty object when there is no payload.
+     */
+    function fromPython(value) {
+      if (typeof value === "string") {
+        return JSON.parse(value) ?? {};
+      }
+      if (!value) {
+        return {};
+      }
+      return mapToObject(value.toJs ? value.toJs() : value);
+    }
+
     // Pre-load micropip
     await pyodide.loadPackage(["micropip"]);
 
@@ -150,14 +167,9 @@ if not os.environ.get('MPLBACKEND'):
     // Set up callbacks ONCE during initialization (JupyterLite pattern)
     // These callbacks will use the msg_id passed from Python
     const publishExecutionResult = (msg_id, _prompt_count, data, metadata) => {
-      // Convert Python dict to plain JavaScript object
-      const dataObj = data.toJs ? data.toJs() : data;
-      const metadataObj =
-        metadata && metadata.toJs ? metadata.toJs() : metadata;
-
-      // Recursively convert Maps to plain objects for postMessage compatibility
-      const formattedData = mapToObject(dataObj);
-      const formattedMetadata = metadataObj ? mapToObject(metadataObj) : {};
+      // Parse the JSON payloads into plain objects for postMessage
+      const formattedData = fromPython(data);
+      const formattedMetadata = fromPython(metadata);
 
       self.postMessage({
         id: msg_id,
@@ -172,14 +184,9 @@ if not os.environ.get('MPLBACKEND'):
     };
 
     const displayDataCallback = (msg_id, data, metadata, _transient) => {
-      // Convert Python dict to plain JavaScript object
-      const dataObj = data.toJs ? data.toJs() : data;
-      const metadataObj =
-        metadata && metadata.toJs ? metadata.toJs() : metadata;
-
-      // Recursively convert Maps to plain objects for postMessage compatibility
-      const formattedData = mapToObject(dataObj);
-      const formattedMetadata = metadataObj ? mapToObject(metadataObj) : {};
+      // Parse the JSON payloads into plain objects for postMessage
+      const formattedData = fromPython(data);
+      const formattedMetadata = fromPython(metadata);
 
       self.postMessage({
         id: msg_id,
@@ -194,14 +201,9 @@ if not os.environ.get('MPLBACKEND'):
     };
 
     const updateDisplayDataCallback = (msg_id, data, metadata, _transient) => {
-      // Convert Python dict to plain JavaScript object
-      const dataObj = data.toJs ? data.toJs() : data;
-      const metadataObj =
-        metadata && metadata.toJs ? metadata.toJs() : metadata;
-
-      // Recursively convert Maps to plain objects for postMessage compatibility
-      const formattedData = mapToObject(dataObj);
-      const formattedMetadata = metadataObj ? mapToObject(metadataObj) : {};
+      // Parse the JSON payloads into plain objects for postMessage
+      const formattedData = fromPython(data);
+      const formattedMetadata = fromPython(metadata);
 
       self.postMessage({
         id: msg_id,
@@ -327,12 +329,12 @@ self.addEventListener("message", async (event) => {
 
       self.postMessage({ id, type: "status", status: "busy" });
 
-      // Store the PARENT MESSAGE ID (string) in Python's builtins
+      // Store the PARENT MESSAGE ID (string) in the pyodide_kernel module
       // This is the execute_request msg_id that matches parent_header in iopub messages
       // Python callbacks will send this back so outputs route to the correct cell
       const msgIdForPython = parent_msg_id || id;
       await pyodide.runPythonAsync(
-        `import builtins\nbuiltins._current_msg_id = "${msgIdForPython}"`,
+        `import pyodide_kernel\npyodide_kernel.set_current_msg_id("${msgIdForPython}")`,
       );
 
       // Auto-load packages
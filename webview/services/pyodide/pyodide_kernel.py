@@ -12,10 +12,12 @@ Uses callback pattern to avoid serialization issues with PyProxy objects.
 from __future__ import annotations
 
 from binascii import b2a_base64
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+import functools
 import math
 import numbers
 import sys
-import types
 from typing import Any
 
 from IPython.core.displayhook import DisplayHook
@@ -23,101 +25,375 @@ from IPython.core.displaypub import DisplayPublisher
 from IPython.core.interactiveshell import InteractiveShell
 
 
-def json_clean(obj: Any) -> Any:  # noqa: PLR0911
-    """Clean an object to ensure it's safe to encode in JSON.
+# A frame is (parent container, key or index in parent, value to clean)
+_Frame = tuple[Any, Any, Any]
 
-    Based on jupyterlite-pyodide-kernel's jsonutil.py
-    """
-    # types that are 'atomic' and ok in json as-is
-    atomic_ok = (str, type(None))
+# A cleaner returns the JSON-safe form of a value; container cleaners return
+# an empty output container and push frames for its children onto the stack.
+# The set holds the ids of the containers on the path being expanded.
+_Cleaner = Callable[[Any, deque[_Frame], set[int]], Any]
 
-    # containers that we need to convert into lists
-    container_to_list = (tuple, set, types.GeneratorType)
+# Marks the frame that closes a container once all its children are cleaned
+_LEAVE = object()
 
-    if isinstance(obj, bool):
-        return obj
 
-    if isinstance(obj, numbers.Integral):
-        return int(obj)
+def _enter(obj: Any, stack: deque[_Frame], path: set[int]) -> None:
+    # A container that is already on the path refers to itself; the worklist
+    # would otherwise keep expanding it forever
+    obj_id = id(obj)
+    if obj_id in path:
+        raise ValueError(
+            "object cannot be safely converted to JSON: "
+            "it contains a reference cycle"
+        )
+    path.add(obj_id)
+    # Pushed before the children, so it is popped after all of them; holding
+    # obj in the frame also keeps its id from being reused until then
+    stack.append((None, obj, _LEAVE))
 
-    if isinstance(obj, numbers.Real):
-        # cast out-of-range floats to their reprs
-        if math.isnan(obj) or math.isinf(obj):
-            return repr(obj)
-        return float(obj)
 
-    if isinstance(obj, atomic_ok):
-        return obj
+def _clean_identity(obj: Any, stack: deque[_Frame], path: set[int]) -> Any:
+    return obj
 
-    if isinstance(obj, bytes):
-        # binary data is base64-encoded
-        return b2a_base64(obj).decode("ascii")
 
-    if isinstance(obj, container_to_list) or (
-        hasattr(obj, "__iter__") and hasattr(obj, "__next__")
-    ):
-        obj = list(obj)
+def _clean_int(obj: Any, stack: deque[_Frame], path: set[int]) -> int:
+    return int(obj)
 
-    if isinstance(obj, list):
-        return [json_clean(x) for x in obj]
 
-    if isinstance(obj, dict):
-        # Validate that the dict won't lose data due to key collisions
-        nkeys = len(obj)
-        nkeys_collapsed = len(set(map(str, obj)))
-        if nkeys != nkeys_collapsed:
+def _clean_float(obj: Any, stack: deque[_Frame], path: set[int]) -> float | str:
+    # cast out-of-range floats to their reprs
+    if math.isnan(obj) or math.isinf(obj):
+        return repr(obj)
+    return float(obj)
+
+
+# Small binary payloads (icons, widget assets) are often re-displayed verbatim,
+# so their encodings are memoized; larger ones bypass the cache so it never
+# pins whole figures in memory
+_BYTES_CACHE_MAX_LEN = 1024  # largest payload, in bytes, that gets cached
+_BYTES_CACHE_MAX_ENTRIES = 1024  # number of encodings kept
+
+
+@functools.lru_cache(maxsize=_BYTES_CACHE_MAX_ENTRIES)
+def _encode_bytes_cached(obj: bytes) -> str:
+    return b2a_base64(obj, newline=False).decode("ascii")
+
+
+def _encode_bytes(obj: bytes) -> str:
+    if len(obj) <= _BYTES_CACHE_MAX_LEN:
+        return _encode_bytes_cached(obj)
+    return b2a_base64(obj, newline=False).decode("ascii")
+
+
+def _clean_bytes(obj: bytes, stack: deque[_Frame], path: set[int]) -> str:
+    # binary data is base64-encoded
+    return _encode_bytes(obj)
+
+
+# Exact types that json_clean returns unchanged
+_PASSTHROUGH_TYPES = frozenset((bool, int, str, type(None)))
+
+
+def _all_json_safe(values: Iterable[Any]) -> bool:
+    """Check whether every value is a scalar json_clean would return unchanged.
+
+    Lets homogeneous containers (e.g. numeric arrays in MIME data) be copied
+    in one C-level call instead of pushing a frame per element.
+    """
+    value_types = set(map(type, values))
+    if value_types <= _PASSTHROUGH_TYPES:
+        return True
+    if float not in value_types or not (value_types - {float}) <= _PASSTHROUGH_TYPES:
+        return False
+    # NaN and infinities still need to be cast to their reprs
+    return all(math.isfinite(v) for v in values if type(v) is float)
+
+
+def _push_items(items: list[Any], stack: deque[_Frame]) -> list[Any]:
+    out: list[Any] = [None] * len(items)
+    stack.extend((out, i, x) for i, x in enumerate(items))
+    return out
+
+
+def _clean_list(obj: list[Any], stack: deque[_Frame], path: set[int]) -> list[Any]:
+    if _all_json_safe(obj):
+        return list(obj)
+    _enter(obj, stack, path)
+    return _push_items(obj, stack)
+
+
+def _clean_iterable(obj: Any, stack: deque[_Frame], path: set[int]) -> list[Any]:
+    items = list(obj)
+    if _all_json_safe(items):
+        return items
+    # Enter the original container, not the temporary list, so cycles that
+    # run through tuples are still caught
+    _enter(obj, stack, path)
+    return _push_items(items, stack)
+
+
+def _clean_dict(
+    obj: dict[Any, Any], stack: deque[_Frame], path: set[int]
+) -> dict[str, Any]:
+    if all(type(k) is str for k in obj):
+        # str keys are already distinct, so there is nothing to collide
+        if _all_json_safe(obj.values()):
+            return dict(obj)
+        _enter(obj, stack, path)
+        # Reserve every slot up front so the output keeps the input key order
+        out: dict[str, Any] = dict.fromkeys(obj)
+        stack.extend((out, k, v) for k, v in obj.items())
+        return out
+
+    # Make a json-safe dict, validating in the same pass that it
+    # won't lose data due to key collisions
+    _enter(obj, stack, path)
+    out = {}
+    for k, v in obj.items():
+        str_key = str(k)
+        if str_key in out:
             raise ValueError(
                 "dict cannot be safely converted to JSON: "
                 "key collision would lead to dropped values"
             )
-        # Make a json-safe dict
-        out = {}
-        for k, v in obj.items():
-            out[str(k)] = json_clean(v)
-        return out
+        # Reserve the slot now so the output keeps the input key order
+        out[str_key] = None
+        stack.append((out, str_key, v))
+    return out
+
 
+def _clean_repr(obj: Any, stack: deque[_Frame], path: set[int]) -> str:
     # we don't understand it, return string representation
     return str(obj)
 
 
-def encode_images(format_dict: dict[str, Any]) -> dict[str, Any]:
-    """Encode images in base64 for display.
+# Cleaners for exact builtin types, so the common case is a single dict lookup.
+# Exact str, int and bool never get here: json_clean passes them through inline.
+_FAST: dict[type, _Cleaner] = {
+    type(None): _clean_identity,
+    float: _clean_float,
+    bytes: _clean_bytes,
+    list: _clean_list,
+    tuple: _clean_iterable,
+    dict: _clean_dict,
+}
+
 
-    In Python 3 / Pyodide, bytes are already handled, so this is mostly a pass-through.
-    Based on jupyterlite-pyodide-kernel's jsonutil.py
+def _resolve_cleaner(obj: Any) -> _Cleaner:  # noqa: PLR0911
+    """Pick a cleaner for a value whose exact type is not in ``_FAST``.
+
+    Handles subclasses and foreign types such as numpy scalars, sets and generators.
     """
-    return format_dict
+    # containers that we need to convert into lists; Iterator covers generators
+    container_to_list = (tuple, set, frozenset, Iterator)
+
+    # Checks are ordered by how often each kind shows up in display payloads.
+    # str subclasses are returned as-is, like str itself.
+    if isinstance(obj, str):
+        return _clean_identity
+
+    # bool cannot be subclassed, so every bool was already matched exactly
+    # and numbers.Integral here only sees int subclasses and numpy integers
+    if isinstance(obj, numbers.Integral):
+        return _clean_int
+
+    if isinstance(obj, numbers.Real):
+        return _clean_float
+
+    if isinstance(obj, dict):
+        return _clean_dict
+
+    if isinstance(obj, list):
+        return _clean_list
+
+    if isinstance(obj, bytes):
+        return _clean_bytes
+
+    if isinstance(obj, container_to_list):
+        return _clean_iterable
+
+    return _clean_repr
+
+
+def json_clean(obj: Any) -> Any:
+    """Clean an object to ensure it's safe to encode in JSON.
+
+    Based on jupyterlite-pyodide-kernel's jsonutil.py, but walks nested
+    containers with an explicit worklist instead of recursing, so deeply
+    nested outputs neither pay a Python frame per level nor hit the
+    recursion limit. Reference cycles raise ValueError.
+    """
+    root: list[Any] = [None]
+    stack: deque[_Frame] = deque([(root, 0, obj)])
+    path: set[int] = set()
+    # Types classified by the isinstance ladder are remembered for the rest of
+    # this walk, so e.g. an array of numpy.float64 resolves its cleaner once.
+    # The module table is only copied on the first miss.
+    cleaners = _FAST
+
+    while stack:
+        parent, key, value = stack.pop()
+        value_type = type(value)
+        # str is the most common leaf (MIME text); it, int and bool (checked
+        # exactly, so bool needs no ordering against int) pass through as-is
+        if value_type is str or value_type is int or value_type is bool:
+            parent[key] = value
+            continue
+        if value is _LEAVE:
+            path.discard(id(key))
+            continue
+        cleaner = cleaners.get(value_type)
+        if cleaner is None:
+            if cleaners is _FAST:
+                cleaners = dict(_FAST)
+            cleaner = cleaners[value_type] = _resolve_cleaner(value)
+        parent[key] = cleaner(value, stack, path)
+
+    return root[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _json_encoder() -> Callable[[Any], str]:
+    """Pick the JSON encoder for payloads handed to the JS bridge.
+
+    orjson is used when it has been loaded into Pyodide; otherwise the
+    stdlib encoder. Resolved lazily so importing this module stays cheap.
+    """
+    import json
+
+    stdlib_dumps = functools.partial(json.dumps, separators=(",", ":"))
+
+    try:
+        import orjson
+    except ImportError:
+        return stdlib_dumps
+
+    def orjson_dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # orjson rejects some valid input the stdlib accepts, such as
+            # integers beyond 64 bits and strings with lone surrogates
+            return stdlib_dumps(obj)
+
+    return orjson_dumps
+
+
+def json_dumps(obj: Any) -> str:
+    """Serialize a json_clean'ed payload to JSON text for the JS bridge.
+
+    One JSON string crosses the Python/JS boundary far faster than a nested
+    PyProxy that has to be converted entry by entry with toJs().
+    """
+    return _json_encoder()(obj)
+
+
+def _noop(*args: Any, **kwargs: Any) -> None:
+    """Stand-in for host callbacks that have not been installed.
+
+    Installed as a class-level staticmethod, so instances see ``_noop`` itself
+    and can test ``callback is _noop`` to skip work nobody will receive.
+    """
+
+
+# Parent message ID of the execution in progress. Kept as a module global
+# rather than on builtins so output callbacks read it with one lookup.
+_current_msg_id: str | int | None = None
+
+
+def set_current_msg_id(msg_id: str | int | None) -> None:
+    """Set the message ID that subsequent outputs are routed to.
+
+    Called by the host before each execution.
+    """
+    global _current_msg_id
+    # Drain output still buffered for the previous execution before rerouting
+    _flush_streams()
+    _current_msg_id = msg_id
+
+
+def _flush_streams() -> None:
+    """Publish any buffered stdout/stderr text.
+
+    Called before other outputs so ordering is preserved, and after each cell.
+    """
+    stdout_stream.flush()
+    stderr_stream.flush()
+
+
+# Buffered stream text is published once this many characters are pending
+_STREAM_BUFFER_SIZE = 4096
 
 
 class LiteStream:
-    """Stream that calls a callback instead of directly posting messages."""
+    """Stream that calls a callback instead of directly posting messages.
+
+    Writes are buffered and published per line (or every ``_STREAM_BUFFER_SIZE``
+    characters), so chunked output does not cost one JS bridge call per chunk.
+    """
+
+    __slots__ = (
+        "name",
+        "_original_stream",
+        "_publish_stream_callback",
+        "_fast_write",
+        "_buf",
+        "_buf_size",
+    )
 
     encoding = "utf-8"
 
     def __init__(self, name: str) -> None:
         self.name = name
+        # Store reference to original stream for debugging. sys.__stdout__/__stderr__
+        # survive our replacement of sys.stdout/stderr, even across re-imports.
+        self._original_stream = sys.__stdout__ if name == "stdout" else sys.__stderr__
+        self._buf: list[str] = []
+        self._buf_size = 0
         self.publish_stream_callback = None
-        # Store reference to original stream for debugging (before we replace sys.stdout/stderr)
-        import sys
-        self._original_stream = sys.stdout if name == "stdout" else sys.stderr
 
-    def write(self, text: str) -> int:
-        if self.publish_stream_callback:
-            # Get current message ID from global variable
-            import builtins
+    @property
+    def publish_stream_callback(self) -> Callable[[Any, str, str], Any] | None:
+        return self._publish_stream_callback
 
-            msg_id = getattr(builtins, "_current_msg_id", None)
-            if msg_id is not None:
-                self.publish_stream_callback(msg_id, self.name, text)
-        else:
+    @publish_stream_callback.setter
+    def publish_stream_callback(self, callback: Callable[[Any, str, str], Any] | None) -> None:
+        self._publish_stream_callback = callback
+        self._set_callback(callback)
+
+    def _set_callback(self, callback: Callable[[Any, str, str], Any] | None) -> None:
+        """Resolve where writes go once, so write() is a single indirect call."""
+        if not callback:
             # Fall back to original Pyodide stream for debugging
             # This allows print() statements to work during initialization
-            if hasattr(self._original_stream, 'write'):
-                self._original_stream.write(text)
-        return len(text) if text else 0
+            original_write = getattr(self._original_stream, "write", None)
+            self._fast_write = original_write or (lambda text: None)
+            return
+
+        name = self.name
+
+        def fast_write(text: str) -> None:
+            msg_id = _current_msg_id
+            if msg_id is not None:
+                callback(msg_id, name, text)
+
+        self._fast_write = fast_write
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        self._buf.append(text)
+        self._buf_size += len(text)
+        if self._buf_size >= _STREAM_BUFFER_SIZE or "\n" in text:
+            self.flush()
+        return len(text)
 
     def flush(self) -> None:
-        pass
+        if self._buf:
+            text = "".join(self._buf)
+            self._buf.clear()
+            self._buf_size = 0
+            self._fast_write(text)
 
     def isatty(self) -> bool:
         return False
@@ -126,16 +402,12 @@ class LiteStream:
 class LiteDisplayPublisher(DisplayPublisher):
     """DisplayPublisher that calls callbacks instead of directly posting messages."""
 
-    def __init__(
-        self,
-        shell: InteractiveShell | None = None,
-        *args: Any,
-        **kwargs: Any,
-    ) -> None:
-        super().__init__(shell, *args, **kwargs)
-        self.clear_output_callback = None
-        self.update_display_data_callback = None
-        self.display_data_callback = None
+    # IPython's traitlets base classes carry a __dict__, so __slots__ would not
+    # help; class-level defaults keep callbacks out of the instance dict until
+    # set, and being no-ops they can be called without checking for None
+    clear_output_callback = staticmethod(_noop)
+    update_display_data_callback = staticmethod(_noop)
+    display_data_callback = staticmethod(_noop)
 
     def publish(
         self,
@@ -147,34 +419,49 @@ class LiteDisplayPublisher(DisplayPublisher):
         update: bool = False,
         **kwargs: Any,
     ) -> None:
-        # Get current message ID from global variable
-        import builtins
-
-        msg_id = getattr(builtins, "_current_msg_id", None)
+        _flush_streams()
+        msg_id = _current_msg_id
         if msg_id is None:
             return
 
-        if update and self.update_display_data_callback:
-            self.update_display_data_callback(msg_id, data, metadata, transient)
-        elif self.display_data_callback:
-            self.display_data_callback(msg_id, data, metadata, transient)
+        # Hosts that don't install an update callback receive updates as new
+        # display data
+        callback = self.update_display_data_callback if update else _noop
+        if callback is _noop:
+            callback = self.display_data_callback
+        # Nothing to deliver to, so skip cleaning and serializing the payload
+        if callback is _noop:
+            return
+
+        callback(
+            msg_id,
+            json_dumps(json_clean(data)),
+            json_dumps(json_clean(metadata)),
+            transient,
+        )
 
     def clear_output(self, wait: bool = False) -> None:
-        if self.clear_output_callback:
-            # Get current message ID from global variable
-            import builtins
-
-            msg_id = getattr(builtins, "_current_msg_id", None)
-            if msg_id is not None:
-                self.clear_output_callback(msg_id, wait)
+        _flush_streams()
+        msg_id = _current_msg_id
+        if msg_id is not None:
+            self.clear_output_callback(msg_id, wait)
 
 
 class LiteInteractiveShell(InteractiveShell):
     """Custom InteractiveShell that captures execution errors via callback."""
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        self.publish_error_callback = None
+    publish_error_callback = staticmethod(_noop)
+
+    async def run_cell_async(self, *args: Any, **kwargs: Any) -> Any:
+        """Run a cell, then publish trailing stream output that lacked a newline.
+
+        run_cell() delegates here too, and unlike the post_run_cell event this
+        also covers hosts that await run_cell_async() directly.
+        """
+        try:
+            return await super().run_cell_async(*args, **kwargs)
+        finally:
+            _flush_streams()
 
     def _showtraceback(self, etype: type, evalue: BaseException, stb: list[str]) -> None:
         """Override _showtraceback to capture formatted traceback.
@@ -182,27 +469,26 @@ class LiteInteractiveShell(InteractiveShell):
         This is called by IPython's showtraceback() after it has formatted the traceback.
         The stb parameter contains the already-formatted traceback as a list of strings.
         """
+        _flush_streams()
         # Send error via callback - stb is already formatted by IPython
-        if self.publish_error_callback:
-            import builtins
-
-            msg_id = getattr(builtins, "_current_msg_id", None)
-            if msg_id is not None and etype is not None:
-                # stb is already a formatted traceback list from IPython
-                self.publish_error_callback(
-                    msg_id,
-                    etype.__name__ if etype else "Error",
-                    str(evalue) if evalue else "",
-                    stb,  # Use the pre-formatted traceback from IPython
-                )
+        msg_id = _current_msg_id
+        if msg_id is not None and etype is not None:
+            # stb is already a formatted traceback list from IPython
+            self.publish_error_callback(
+                msg_id,
+                etype.__name__,
+                str(evalue) if evalue is not None else "",
+                stb,  # Use the pre-formatted traceback from IPython
+            )
 
 
 class LiteDisplayHook(DisplayHook):
     """DisplayHook that calls a callback instead of directly posting messages."""
 
+    publish_execution_result = staticmethod(_noop)
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
-        self.publish_execution_result = None
         self.data: dict[str, Any] = {}
         self.metadata: dict[str, Any] = {}
 
@@ -218,21 +504,33 @@ class LiteDisplayHook(DisplayHook):
         format_dict: dict[str, Any],
         md_dict: dict[str, Any] | None = None,
     ) -> None:
-        # Clean and encode the data like JupyterLite does
-        self.data = json_clean(encode_images(format_dict))
-        self.metadata = md_dict or {}
+        # IPython format dicts almost always map MIME types to text (str) or
+        # image data (bytes), which only need the bytes base64-encoded
+        if all(
+            type(k) is str and (type(v) is str or type(v) is bytes)
+            for k, v in format_dict.items()
+        ):
+            self.data = {
+                k: _encode_bytes(v) if type(v) is bytes else v
+                for k, v in format_dict.items()
+            }
+        else:
+            # Clean the data like JupyterLite does; json_clean also base64-encodes
+            # image bytes, so JupyterLite's separate encode_images pass is not needed
+            self.data = json_clean(format_dict)
+        self.metadata = json_clean(md_dict) if md_dict else {}
 
     def finish_displayhook(self) -> None:
-        sys.stdout.flush()
-        sys.stderr.flush()
-
-        if self.publish_execution_result:
-            # Get current message ID from global variable
-            import builtins
-
-            msg_id = getattr(builtins, "_current_msg_id", None)
-            if msg_id is not None:
-                self.publish_execution_result(msg_id, self.prompt_count, self.data, self.metadata)
+        # Drain our streams directly rather than via sys.stdout/sys.stderr
+        _flush_streams()
+
+        msg_id = _current_msg_id
+        callback = self.publish_execution_result
+        # Skip serializing the result when no host callback is installed
+        if msg_id is not None and callback is not _noop:
+            callback(
+                msg_id, self.prompt_count, json_dumps(self.data), json_dumps(self.metadata)
+            )
 
         self.data = {}
         self.metadata = {}
@@ -0,0 +1,213 @@
+#
+# Copyright (c) 2021-2025 Datalayer, Inc.
+#
+# MIT License
+#
+"""Tests for the Pyodide kernel module (run with ``npm run test:python``; needs IPython)."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import json
+from pathlib import Path
+import sys
+from typing import Any
+
+import pytest
+
+pytest.importorskip("IPython")
+
+KERNEL_PATH = (
+    Path(__file__).parents[2] / "services" / "pyodide" / "pyodide_kernel.py"
+)
+
+
+def _load_kernel():
+    # Importing the kernel replaces sys.stdout/stderr; restore them for pytest
+    stdout, stderr = sys.stdout, sys.stderr
+    try:
+        spec = importlib.util.spec_from_file_location("pyodide_kernel", KERNEL_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    return module
+
+
+kernel = _load_kernel()
+shell = kernel.ipython_shell
+
+
+@pytest.fixture
+def host():
+    """Install recording host callbacks, as the worker and client do, and remove them after."""
+    events: list[tuple[Any, ...]] = []
+
+    def record(kind):
+        return lambda *args: events.append((kind, *args))
+
+    kernel.stdout_stream.publish_stream_callback = record("stream")
+    kernel.stderr_stream.publish_stream_callback = record("stream")
+    shell.publish_error_callback = record("error")
+    shell.display_pub.display_data_callback = record("display")
+    shell.display_pub.clear_output_callback = record("clear")
+    shell.displayhook.publish_execution_result = record("result")
+    kernel.set_current_msg_id("msg-1")
+    yield events
+    kernel.set_current_msg_id(None)
+    kernel.stdout_stream.publish_stream_callback = None
+    kernel.stderr_stream.publish_stream_callback = None
+    # Dropping the instance attributes restores the class-level defaults
+    for obj, name in [
+        (shell, "publish_error_callback"),
+        (shell.display_pub, "display_data_callback"),
+        (shell.display_pub, "update_display_data_callback"),
+        (shell.display_pub, "clear_output_callback"),
+        (shell.displayhook, "publish_execution_result"),
+    ]:
+        vars(obj).pop(name, None)
+
+
+def test_json_clean_nested_payload():
+    data = {"a": {"b": [1, (2, 3), b"\x00\x01"]}, 1: float("nan")}
+    assert kernel.json_clean(data) == {"a": {"b": [1, [2, 3], "AAE="]}, "1": "nan"}
+
+
+def test_json_clean_rejects_key_collision():
+    with pytest.raises(ValueError):
+        kernel.json_clean({1: "a", "1": "b"})
+
+
+def test_json_clean_handles_nesting_beyond_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    data: list = []
+    innermost = data
+    for _ in range(depth):
+        innermost.append([])
+        innermost = innermost[0]
+    cleaned = kernel.json_clean(data)
+    for _ in range(depth):
+        cleaned = cleaned[0]
+    assert cleaned == []
+
+
+def test_json_clean_allows_shared_references():
+    shared = [1, {"a": [None]}]
+    assert kernel.json_clean({"x": shared, "y": [shared, shared]}) == {
+        "x": shared,
+        "y": [shared, shared],
+    }
+
+
+@pytest.mark.parametrize("kind", ["list", "dict", "tuple"])
+def test_json_clean_rejects_reference_cycle(kind):
+    if kind == "list":
+        cyclic: object = []
+        cyclic.append(cyclic)
+    elif kind == "dict":
+        cyclic = {}
+        cyclic["self"] = [cyclic]
+    else:
+        cyclic = ([],)
+        cyclic[0].append(cyclic)
+    with pytest.raises(ValueError):
+        kernel.json_clean(cyclic)
+
+
+@pytest.mark.parametrize("payload", [{"n": 2**70}, {"text/plain": "\ud800"}])
+def test_json_dumps_encodes_input_orjson_rejects(payload):
+    # Whichever encoder is active, these must serialize like the stdlib does
+    assert kernel.json_dumps(kernel.json_clean(payload)) == json.dumps(
+        payload, separators=(",", ":")
+    )
+
+
+def test_write_format_data_encodes_bytes_in_str_bytes_payload():
+    hook = shell.displayhook
+    hook.write_format_data({"text/plain": "fig", "image/png": b"\x89PNG"})
+    assert hook.data == {"text/plain": "fig", "image/png": "iVBORw=="}
+
+
+def test_write_format_data_cleans_other_payloads():
+    hook = shell.displayhook
+    hook.write_format_data(
+        {"text/plain": "x", "application/json": {"a": (1, float("inf"))}},
+        {"application/json": {"expanded": True}},
+    )
+    assert hook.data == {"text/plain": "x", "application/json": {"a": [1, "inf"]}}
+    assert hook.metadata == {"application/json": {"expanded": True}}
+
+
+def test_display_data_is_sent_as_json_text(host):
+    shell.display_pub.publish({"image/png": b"\x89PNG"}, {"width": 10})
+    [(kind, msg_id, data, metadata, _transient)] = host
+    assert (kind, msg_id) == ("display", "msg-1")
+    assert json.loads(data) == {"image/png": "iVBORw=="}
+    assert json.loads(metadata) == {"width": 10}
+
+
+def test_execution_result_is_sent_as_json_text(host):
+    shell.run_cell("{'a': 1}")
+    [(kind, msg_id, _count, data, metadata)] = host
+    assert (kind, msg_id) == ("result", "msg-1")
+    assert json.loads(data) == {"text/plain": "{'a': 1}"}
+    assert json.loads(metadata) == {}
+
+
+def test_stream_buffers_until_newline(host):
+    stream = kernel.stdout_stream
+    stream.write("a")
+    stream.write("b")
+    assert host == []
+    stream.write("c\n")
+    assert host == [("stream", "msg-1", "stdout", "abc\n")]
+
+
+def test_stream_publishes_when_buffer_fills(host):
+    kernel.stdout_stream.write("x" * kernel._STREAM_BUFFER_SIZE)
+    assert host == [("stream", "msg-1", "stdout", "x" * kernel._STREAM_BUFFER_SIZE)]
+
+
+def test_stream_drains_before_switching_message_id(host):
+    kernel.stdout_stream.write("partial")
+    kernel.set_current_msg_id("msg-2")
+    assert host == [("stream", "msg-1", "stdout", "partial")]
+
+
+def test_stream_drains_before_display_data(host):
+    kernel.stdout_stream.write("before")
+    shell.display_pub.publish({"text/plain": "shown"})
+    assert [event[0] for event in host] == ["stream", "display"]
+
+
+@pytest.mark.filterwarnings("ignore:`run_cell_async` will not call:DeprecationWarning")
+def test_run_cell_async_drains_trailing_partial_line(host, monkeypatch):
+    # The extension-side client awaits run_cell_async() directly
+    monkeypatch.setattr(sys, "stdout", kernel.stdout_stream)
+    asyncio.run(shell.run_cell_async("print('done', end='')"))
+    assert host == [("stream", "msg-1", "stdout", "done")]
+
+
+def test_update_display_falls_back_to_display_callback(host):
+    shell.display_pub.publish({"text/plain": "v2"}, update=True)
+    [(kind, _msg_id, data, _metadata, _transient)] = host
+    assert kind == "display"
+    assert json.loads(data) == {"text/plain": "v2"}
+
+
+def test_update_display_uses_update_callback_when_installed(host):
+    shell.display_pub.update_display_data_callback = (
+        lambda *args: host.append(("update", *args))
+    )
+    shell.display_pub.publish({"text/plain": "v2"}, update=True)
+    assert [event[0] for event in host] == ["update"]
+
+
+def test_publish_without_host_callback_skips_serialization(host):
+    vars(shell.display_pub).pop("display_data_callback")
+    cyclic: list = []
+    cyclic.append(cyclic)
+    # Would raise ValueError from json_clean if the payload were serialized
+    shell.display_pub.publish({"application/json": cyclic})
+    assert host == []